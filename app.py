@@ -4,6 +4,7 @@ Streamlit UI for Psychology Research Assistant
 All RAG logic is in walter_v2.py
 """
 
+from concurrent.futures import Future, ThreadPoolExecutor
 import streamlit as st
 from walter_v2 import PsychologyRAG
 
@@ -14,13 +15,42 @@ st.set_page_config(
     layout="centered"
 )
 
+# Load RAG model (one shared instance per process, not per session)
+@st.cache_resource(show_spinner=False)
+def get_rag():
+    """Initialize the RAG model (cached across sessions)"""
+    rag = PsychologyRAG()
+    try:
+        rag.load_or_create_index()
+    except Exception:
+        # Release the storage lock so "Initialize System" can retry
+        rag.close()
+        raise
+    return rag
+
+def _warm_up_rag(load: Future):
+    """Warm up the RAG model once the background load has succeeded"""
+    if load.exception() is None:
+        load.result().warm_up()
+
+@st.cache_resource(show_spinner=False)
+def prewarm_rag():
+    """Start loading the RAG model in the background (once per process)"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    load = executor.submit(get_rag)
+    # Runs after the load on the same worker, so it never delays the result
+    executor.submit(_warm_up_rag, load)
+    executor.shutdown(wait=False)
+    return load
+
+# Start loading right away so it overlaps with rendering the page below
+loader = prewarm_rag()
+
 # Title
 st.title("🧠 Psychology Research Assistant")
 st.markdown("Ask questions about your research papers!")
 
 # Initialize session state
-if 'rag_model' not in st.session_state:
-    st.session_state.rag_model = None
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 
@@ -51,20 +81,33 @@ with st.sidebar:
         value=0.1,
         step=0.1
     )
-    
+
+# Wait for the background load - returns at once if it already finished
+try:
+    with st.spinner("Loading index..."):
+        rag = loader.result()
+except Exception as e:
+    st.error(f"Error initializing model: {str(e)}")
+    rag = None
+
+with st.sidebar:
     # Index management
     st.header("Index Management")
     
     if st.button("🔄 Rebuild Index", help="Re-process all documents"):
-        if st.session_state.rag_model:
-            with st.spinner("Rebuilding index..."):
-                st.session_state.rag_model.rebuild_index()
+        if rag:
+            try:
+                with st.spinner("Rebuilding index..."):
+                    rag.rebuild_index()
+            except Exception as e:
+                st.error(f"Error rebuilding index: {str(e)}")
+            else:
                 st.success("Index rebuilt!")
                 st.rerun()
     
     # Show index status
-    if st.session_state.rag_model:
-        stats = st.session_state.rag_model.get_index_stats()
+    if rag:
+        stats = rag.get_index_stats()
         if stats["loaded"]:
             st.success("✅ Index loaded")
             with st.expander("Index Details"):
@@ -72,27 +115,19 @@ with st.sidebar:
         else:
             st.info("📚 Index not loaded yet")
 
-# Load RAG model
-@st.cache_resource(show_spinner=False)
-def initialize_rag_model():
-    """Initialize the RAG model (cached across sessions)"""
-    try:
-        with st.spinner("Initializing RAG model..."):
-            rag = PsychologyRAG()
-            rag.load_or_create_index()
-            return rag
-    except Exception as e:
-        st.error(f"Error initializing model: {str(e)}")
+# Full source chunks are fetched from the index on demand, not kept per session
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_source(node_id):
+    """Full text and metadata of a source chunk (cached across sessions)"""
+    node = rag.get_node(node_id)
+    if node is None:
         return None
-
-# Initialize model if not already done
-if st.session_state.rag_model is None:
-    st.session_state.rag_model = initialize_rag_model()
+    return {"text": node.get_content(), "metadata": node.metadata}
 
 # Chat interface
-if st.session_state.rag_model and st.session_state.rag_model.index:
+if rag and rag.index:
     # Display chat history
-    for message in st.session_state.chat_history:
+    for msg_idx, message in enumerate(st.session_state.chat_history):
         with st.chat_message(message["role"]):
             st.write(message["content"])
             
@@ -101,9 +136,15 @@ if st.session_state.rag_model and st.session_state.rag_model.index:
                 with st.expander("📚 Sources"):
                     for i, source in enumerate(message["sources"]):
                         st.markdown(f"**Source {i+1}** (Score: {source['score']:.3f})")
-                        st.text(source['text'][:500] + "...")
-                        if source.get('metadata'):
-                            st.json(source['metadata'])
+                        st.text(source['preview'])
+                        if st.toggle("Show full text", key=f"full_{msg_idx}_{i}"):
+                            full_source = load_source(source['node_id'])
+                            if full_source:
+                                st.text(full_source['text'])
+                                if full_source['metadata']:
+                                    st.json(full_source['metadata'])
+                            else:
+                                st.caption("This chunk is no longer in the index.")
                         st.divider()
     
     # Chat input
@@ -118,7 +159,7 @@ if st.session_state.rag_model and st.session_state.rag_model.index:
             with st.spinner("Thinking..."):
                 try:
                     # Query the model
-                    result = st.session_state.rag_model.query(
+                    result = rag.query(
                         question=prompt,
                         model_name=model_name,
                         temperature=temperature,
@@ -129,28 +170,22 @@ if st.session_state.rag_model and st.session_state.rag_model.index:
                     response = result["response"]
                     
                     # Handle streaming
-                    response_placeholder = st.empty()
-                    full_response = ""
-                    
                     if result["streaming"] and hasattr(response, 'response_gen'):
-                        # Streaming response
-                        for text in response.response_gen:
-                            full_response += text
-                            response_placeholder.markdown(full_response + "▌")
-                        response_placeholder.markdown(full_response)
+                        # Streaming response - chunks are appended as they arrive
+                        full_response = st.write_stream(response.response_gen)
                     else:
                         # Non-streaming response
                         full_response = str(response)
-                        response_placeholder.markdown(full_response)
+                        st.markdown(full_response)
                     
                     # Prepare sources for storage
                     sources = []
                     if hasattr(response, 'source_nodes') and response.source_nodes:
                         for node in response.source_nodes:
                             sources.append({
+                                'node_id': node.node_id,
                                 'score': node.score,
-                                'text': node.text,
-                                'metadata': node.metadata if hasattr(node, 'metadata') else None
+                                'preview': node.text[:500] + "..."
                             })
                     
                     # Add assistant message to chat with sources
@@ -173,5 +208,9 @@ else:
     """)
     
     if st.button("🚀 Initialize System"):
-        st.session_state.rag_model = None
+        # Release the cached instance's storage lock before loading a new one
+        if rag:
+            rag.close()
+        prewarm_rag.clear()
+        get_rag.clear()
         st.rerun()
\ No newline at end of file
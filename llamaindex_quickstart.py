@@ -7,8 +7,9 @@ load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
 # The famous 5 lines!
-documents = SimpleDirectoryReader("psych_pdfs").load_data()
-index = VectorStoreIndex.from_documents(documents)
-query_engine = index.as_query_engine()
-response = query_engine.query("What are these documents about?")
-print(response)
\ No newline at end of file
+if __name__ == "__main__":
+    documents = SimpleDirectoryReader("psych_pdfs").load_data()
+    index = VectorStoreIndex.from_documents(documents)
+    query_engine = index.as_query_engine()
+    response = query_engine.query("What are these documents about?")
+    print(response)
\ No newline at end of file
@@ -3,55 +3,305 @@
 Core RAG model logic - handles all LlamaIndex operations
 """
 
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext, load_index_from_storage
+from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, StorageContext, Settings, get_response_synthesizer
+from llama_index.core.base.response.schema import AsyncStreamingResponse, StreamingResponse
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore
+from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
+from llama_index.vector_stores.qdrant import QdrantVectorStore
+from qdrant_client import QdrantClient
+from qdrant_client.http.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    Distance,
+    OptimizersConfigDiff,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    VectorParams,
+)
 from dotenv import load_dotenv
+import asyncio
+import functools
+import threading
+import weakref
+from collections import OrderedDict
+import httpx
+import openai
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Sequence, Iterator, AsyncIterator
 
 # Load environment variables
 load_dotenv()
 os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
+# Dimension of the default OpenAI embedding model
+EMBED_DIM = 1536
+DENSE_VECTOR_NAME = "text-dense"
+
+
+# Shared OpenAI connections - keep-alive + HTTP/2, so the TCP/TLS handshake
+# is paid once per process instead of once per query
+@functools.lru_cache(maxsize=1)
+def _get_http_client() -> httpx.Client:
+    """Process-wide HTTP connection pool for sync OpenAI calls"""
+    return openai.DefaultHttpxClient(http2=True, limits=httpx.Limits(max_keepalive_connections=20))
+
+
+# Async pools belong to the event loop that created them, so async clients
+# are kept per loop - a second asyncio.run() gets fresh connections
+_async_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _get_llm(model_name: str, temperature: float) -> OpenAI:
+    """LlamaIndex OpenAI LLM, one per (model_name, temperature)"""
+    # reuse_client=False: sync calls still share the pooled http_client, but
+    # async calls don't pin an AsyncOpenAI to the first event loop
+    return OpenAI(
+        model=model_name,
+        temperature=temperature,
+        http_client=_get_http_client(),
+        reuse_client=False
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _get_synthesizer(model_name: str, temperature: float):
+    """Response synthesizer, one per (model_name, temperature)"""
+    return get_response_synthesizer(llm=_get_llm(model_name, temperature))
+
+
+@functools.lru_cache(maxsize=1)
+def _get_openai_client() -> openai.OpenAI:
+    """Raw OpenAI client for streamed answers"""
+    return openai.OpenAI(http_client=_get_http_client())
+
+
+def _get_async_openai_client() -> openai.AsyncOpenAI:
+    """Raw async OpenAI client for streamed answers, one per running event loop"""
+    loop = asyncio.get_running_loop()
+    client = _async_openai_clients.get(loop)
+    if client is None:
+        client = openai.AsyncOpenAI(
+            http_client=openai.DefaultAsyncHttpxClient(
+                http2=True,
+                limits=httpx.Limits(max_keepalive_connections=20)
+            )
+        )
+        _async_openai_clients[loop] = client
+    return client
+
+
+# Retrieval results kept per PsychologyRAG instance
+RETRIEVAL_CACHE_SIZE = 256
+
+# Chunks per embedding request / per Qdrant upsert (LlamaIndex default is 10)
+EMBED_BATCH_SIZE = 100
+Settings.embed_model = OpenAIEmbedding(
+    embed_batch_size=EMBED_BATCH_SIZE,
+    http_client=_get_http_client(),
+    reuse_client=False
+)
+
+# Files needed before parsing is spread over a (spawn) process pool - each
+# worker re-imports llama_index, which costs more than parsing a few files
+PARALLEL_LOAD_MIN_FILES = 16
+
+# Qdrant's default size (KB of vectors) above which a segment gets an HNSW index
+INDEXING_THRESHOLD = 20000
+# Chunks added by add_documents() before compact() runs automatically
+COMPACT_THRESHOLD = 1000
+
+# System prompt for streamed answers (mirrors LlamaIndex's default QA prompt)
+QA_SYSTEM_PROMPT = (
+    "You answer questions about psychology research papers. "
+    "Use the context provided with each question and not prior knowledge."
+)
+
+
+def _prefetch_file(path: str) -> None:
+    """Ask the kernel to start reading a file into the page cache (POSIX only)"""
+    if not hasattr(os, "posix_fadvise") or not os.path.exists(path):
+        return
+    
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+
+def _load_workers(num_files: int) -> Optional[int]:
+    """Worker processes for SimpleDirectoryReader.load_data (None = parse in-process)"""
+    if num_files < PARALLEL_LOAD_MIN_FILES:
+        return None
+    return min(num_files, os.cpu_count() or 1)
+
 
 class PsychologyRAG:
     """Main RAG model for psychology research papers"""
     
-    def __init__(self, persist_dir: str = "./storage", data_dir: str = "./psych_pdfs"):
+    def __init__(self,
+                 persist_dir: str = "./storage",
+                 data_dir: str = "./psych_pdfs",
+                 collection_name: str = "psych",
+                 qdrant_url: Optional[str] = None):
         self.persist_dir = persist_dir
         self.data_dir = data_dir
+        self.collection_name = collection_name
+        self.qdrant_url = qdrant_url or os.getenv("QDRANT_URL")
         self.index = None
         
+        # Vector DB - chunk text is kept in the point payload, so no docstore is needed.
+        # The on-disk/memmap collection settings only take effect with QDRANT_URL.
+        if self.qdrant_url:
+            # Qdrant server mmaps on-disk vector segments and pages them in on demand
+            self.client = QdrantClient(url=self.qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+        else:
+            # Local mode keeps everything under persist_dir, but unpickles every point
+            # into NumPy on open and scores with a brute-force scan.
+            # Its SQLite scan hits pages in b-tree order, so prefetch the whole file first.
+            _prefetch_file(os.path.join(self.persist_dir, "collection", self.collection_name, "storage.sqlite"))
+            self.client = QdrantClient(path=self.persist_dir)
+        self._ensure_collection()
+        self.vector_store = QdrantVectorStore(
+            client=self.client,
+            collection_name=self.collection_name,
+            dense_vector_name=DENSE_VECTOR_NAME,
+            batch_size=EMBED_BATCH_SIZE,
+            enable_hybrid=False
+        )
+        
+        # Chunks inserted since the last compact()
+        self._staged = 0
+        
+        # Retrieved nodes per (question, top_k) - repeated questions skip the
+        # query embedding and vector search. A plain dict rather than
+        # lru_cache on a bound method, which would make a reference cycle and
+        # keep the Qdrant lock held until a full GC.
+        self._retrieved: "OrderedDict[Tuple[str, int], Tuple[NodeWithScore, ...]]" = OrderedDict()
+        self._retrieved_lock = threading.Lock()
+    
+    def _ensure_collection(self) -> None:
+        """Create the Qdrant collection if it doesn't exist yet
+        
+        on_disk, memmap_threshold and quantization are applied by a Qdrant
+        server (QDRANT_URL); local path= mode stores but ignores them.
+        """
+        if self.client.collection_exists(self.collection_name):
+            return
+        
+        self.client.create_collection(
+            collection_name=self.collection_name,
+            vectors_config={
+                DENSE_VECTOR_NAME: VectorParams(
+                    size=EMBED_DIM,
+                    distance=Distance.COSINE,
+                    on_disk=True
+                )
+            },
+            optimizers_config=OptimizersConfigDiff(memmap_threshold=10000),
+            # int8 copies of the vectors are scored in RAM, full vectors stay on disk
+            quantization_config=ScalarQuantization(
+                scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+            )
+        )
+    
+    def _complete_alias(self) -> str:
+        """Alias created only after a build has finished - stored with the collection"""
+        return f"{self.collection_name}_complete"
+    
+    def _is_complete(self) -> bool:
+        """Whether the collection carries the build-complete alias"""
+        aliases = self.client.get_collection_aliases(self.collection_name).aliases
+        return any(alias.alias_name == self._complete_alias() for alias in aliases)
+    
+    def _set_complete(self, complete: bool) -> None:
+        """Add or remove the build-complete alias"""
+        if complete:
+            operation = CreateAliasOperation(
+                create_alias=CreateAlias(
+                    collection_name=self.collection_name,
+                    alias_name=self._complete_alias()
+                )
+            )
+        else:
+            operation = DeleteAliasOperation(
+                delete_alias=DeleteAlias(alias_name=self._complete_alias())
+            )
+        self.client.update_collection_aliases(change_aliases_operations=[operation])
+    
+    def _reset_collection(self) -> None:
+        """Drop all vectors by deleting and recreating the collection"""
+        if self.client.collection_exists(self.collection_name):
+            if self._is_complete():
+                self._set_complete(False)
+            self.client.delete_collection(self.collection_name)
+        
+        self._ensure_collection()
+    
+    def _vector_count(self) -> int:
+        """Number of vectors stored in the collection"""
+        return self.client.count(collection_name=self.collection_name).count
+        
     def load_or_create_index(self) -> Optional[VectorStoreIndex]:
         """Load existing index or create new one"""
         
-        # Check if we have a persisted index
-        if os.path.exists(self.persist_dir):
+        # Check if we have a persisted index - vectors without the completion
+        # alias are left over from an interrupted (or still running) build
+        if self._is_complete():
             print("Loading existing index...")
-            storage_context = StorageContext.from_defaults(persist_dir=self.persist_dir)
-            self.index = load_index_from_storage(storage_context)
+            self.index = VectorStoreIndex.from_vector_store(self.vector_store)
             print("✅ Loaded existing index!")
             return self.index
         
-        # Create new index
-        if not os.path.exists(self.data_dir):
-            raise FileNotFoundError(f"Data directory '{self.data_dir}' not found!")
+        if self._vector_count() > 0:
+            if self.qdrant_url:
+                # A shared server collection may be mid-build in another process
+                raise RuntimeError(
+                    f"Collection '{self.collection_name}' on {self.qdrant_url} has vectors but "
+                    "no completed build. Call rebuild_index() to rebuild it."
+                )
+            print("Discarding incomplete index...")
+            self._reset_collection()
+        
+        # Create new index - one scandir call checks the directory exists and
+        # stops at the first entry
+        try:
+            with os.scandir(self.data_dir) as entries:
+                first_entry = next(entries, None)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Data directory '{self.data_dir}' not found!") from None
         
-        files = os.listdir(self.data_dir)
-        if not files:
+        if first_entry is None:
             raise ValueError(f"No files found in '{self.data_dir}'!")
         
+        reader = SimpleDirectoryReader(self.data_dir)
+        files = reader.input_files
         print(f"Creating new index from {len(files)} files...")
         
         # The famous 5 lines!
-        documents = SimpleDirectoryReader(self.data_dir).load_data()
-        self.index = VectorStoreIndex.from_documents(
-            documents,
-            show_progress=True
-        )
+        # Parse large corpora in parallel worker processes (PDF parsing is CPU-bound)
+        documents = reader.load_data(num_workers=_load_workers(len(files)))
+        storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
+        try:
+            self.index = VectorStoreIndex.from_documents(
+                documents,
+                storage_context=storage_context,
+                show_progress=True
+            )
+        except Exception:
+            # Vectors are upserted in batches - don't leave a partial collection behind
+            self._reset_collection()
+            raise
         
-        # Persist for next time
-        self.index.storage_context.persist(persist_dir=self.persist_dir)
+        # Qdrant wrote the vectors and chunk text - just mark the build complete
+        self._set_complete(True)
         print(f"✅ Created index from {len(documents)} documents!")
         
         return self.index
@@ -67,18 +317,19 @@ class PsychologyRAG:
         if not self.index:
             raise ValueError("Index not loaded! Call load_or_create_index() first.")
         
-        # Configure LLM
-        llm = OpenAI(model=model_name, temperature=temperature)
-        
-        # Create query engine
-        query_engine = self.index.as_query_engine(
-            llm=llm,
-            similarity_top_k=top_k,
-            streaming=streaming
-        )
+        nodes = self._retrieve(question, top_k)
         
         # Execute query
-        response = query_engine.query(question)
+        if streaming:
+            # Stream straight from OpenAI - skips the synthesizer's extra
+            # templating pass before the first token
+            response = StreamingResponse(
+                response_gen=self._stream_chat(question, nodes, model_name, temperature),
+                source_nodes=list(nodes)
+            )
+        else:
+            synthesizer = _get_synthesizer(model_name, temperature)
+            response = synthesizer.synthesize(question, nodes=list(nodes))
         
         # Package response
         result = {
@@ -88,17 +339,189 @@ class PsychologyRAG:
         
         return result
     
-    def rebuild_index(self) -> None:
-        """Force rebuild the index by deleting storage"""
-        import shutil
+    async def aquery(self,
+                     question: str,
+                     model_name: str = "gpt-3.5-turbo",
+                     temperature: float = 0.1,
+                     top_k: int = 3,
+                     streaming: bool = True) -> Dict[str, Any]:
+        """Async version of query() for callers running an event loop"""
+        
+        if not self.index:
+            raise ValueError("Index not loaded! Call load_or_create_index() first.")
+        
+        # Local Qdrant only has a sync client, so retrieve in a worker thread
+        # and await the LLM call
+        nodes = await asyncio.to_thread(self._retrieve, question, top_k)
+        
+        if streaming:
+            response = AsyncStreamingResponse(
+                response_gen=await self._astream_chat(question, nodes, model_name, temperature),
+                source_nodes=list(nodes)
+            )
+        else:
+            synthesizer = _get_synthesizer(model_name, temperature)
+            response = await synthesizer.asynthesize(question, nodes=list(nodes))
+        
+        # Package response - stream with response.async_response_gen()
+        result = {
+            "response": response,
+            "streaming": streaming and hasattr(response, 'async_response_gen')
+        }
+        
+        return result
+    
+    def _retrieve(self, question: str, top_k: int) -> Tuple[NodeWithScore, ...]:
+        """Retrieve source nodes, reusing the result for repeated questions"""
+        key = (question, top_k)
+        with self._retrieved_lock:
+            if key in self._retrieved:
+                self._retrieved.move_to_end(key)
+                return self._retrieved[key]
+        
+        retriever = self.index.as_retriever(similarity_top_k=top_k)
+        nodes = tuple(retriever.retrieve(question))
         
-        if os.path.exists(self.persist_dir):
-            shutil.rmtree(self.persist_dir)
-            print("Deleted existing index")
+        with self._retrieved_lock:
+            self._retrieved[key] = nodes
+            if len(self._retrieved) > RETRIEVAL_CACHE_SIZE:
+                self._retrieved.popitem(last=False)
+        
+        return nodes
+    
+    def _clear_retrieved(self) -> None:
+        """Forget cached retrieval results (the collection changed)"""
+        with self._retrieved_lock:
+            self._retrieved.clear()
+    
+    @staticmethod
+    def _chat_messages(question: str, nodes: Sequence[NodeWithScore]) -> List[Dict[str, str]]:
+        """Stuff the retrieved context and the question into one chat prompt"""
+        context = "\n\n".join(
+            node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes
+        )
+        
+        return [
+            {"role": "system", "content": QA_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {question}"}
+        ]
+    
+    def _stream_chat(self,
+                     question: str,
+                     nodes: Sequence[NodeWithScore],
+                     model_name: str,
+                     temperature: float) -> Iterator[str]:
+        """Start an OpenAI chat completion and return its token generator"""
+        stream = _get_openai_client().chat.completions.create(
+            model=model_name,
+            messages=self._chat_messages(question, nodes),
+            temperature=temperature,
+            stream=True
+        )
+        
+        def token_gen() -> Iterator[str]:
+            # The with block closes the HTTP response even if the caller stops early
+            with stream:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        
+        return token_gen()
+    
+    async def _astream_chat(self,
+                            question: str,
+                            nodes: Sequence[NodeWithScore],
+                            model_name: str,
+                            temperature: float) -> AsyncIterator[str]:
+        """Async version of _stream_chat()"""
+        stream = await _get_async_openai_client().chat.completions.create(
+            model=model_name,
+            messages=self._chat_messages(question, nodes),
+            temperature=temperature,
+            stream=True
+        )
+        
+        async def token_gen() -> AsyncIterator[str]:
+            async with stream:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+        
+        return token_gen()
+    
+    def add_documents(self, paths: List[str]) -> int:
+        """Add new files to the index without rebuilding it - call compact() when done
+        
+        On a Qdrant server new vectors are stored flat and the HNSW index is
+        only built by compact(). Local path= mode has no HNSW index, so there
+        is nothing to defer and compact() is a no-op.
+        """
+        if not self.index:
+            raise ValueError("Index not loaded! Call load_or_create_index() first.")
+        
+        documents = SimpleDirectoryReader(input_files=paths).load_data(num_workers=_load_workers(len(paths)))
+        nodes = Settings.node_parser.get_nodes_from_documents(documents)
+        
+        # Stage new vectors flat - compact() also runs automatically once
+        # COMPACT_THRESHOLD chunks are staged
+        if self.qdrant_url and not self._staged:
+            self.client.update_collection(
+                collection_name=self.collection_name,
+                optimizers_config=OptimizersConfigDiff(indexing_threshold=0)
+            )
+        
+        self.index.insert_nodes(nodes)
+        self._staged += len(nodes)
+        self._clear_retrieved()
+        print(f"✅ Added {len(nodes)} chunks from {len(documents)} documents")
+        
+        if self._staged >= COMPACT_THRESHOLD:
+            self.compact()
+        
+        return len(nodes)
+    
+    def compact(self) -> None:
+        """Build the HNSW index over everything staged by add_documents()
+        
+        Always restores the indexing threshold, so it also recovers a collection
+        left staged by a previous process. No-op in local path= mode.
+        """
+        self._staged = 0
+        if not self.qdrant_url:
+            return
+        
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            optimizers_config=OptimizersConfigDiff(indexing_threshold=INDEXING_THRESHOLD)
+        )
+        print("Building HNSW index over staged chunks...")
+    
+    def rebuild_index(self) -> None:
+        """Force rebuild the index by dropping the vector collection"""
+        self._reset_collection()
+        print("Deleted existing index")
         
         self.index = None
+        self._staged = 0
+        self._clear_retrieved()
         self.load_or_create_index()
     
+    def get_node(self, node_id: str) -> Optional[BaseNode]:
+        """Fetch a stored chunk (text + metadata) by its node id"""
+        nodes = self.vector_store.get_nodes(node_ids=[node_id])
+        return nodes[0] if nodes else None
+    
+    def warm_up(self) -> None:
+        """Open the pooled OpenAI connection with a tiny embedding request"""
+        try:
+            Settings.embed_model.get_query_embedding("warm-up")
+        except Exception as e:
+            print(f"⚠️ Warm-up request failed: {e}")
+    
+    def close(self) -> None:
+        """Close the Qdrant client (releases the lock on persist_dir in local mode)"""
+        self.client.close()
+    
     def get_index_stats(self) -> Dict[str, Any]:
         """Get statistics about the index"""
         if not self.index:
@@ -106,8 +529,9 @@ class PsychologyRAG:
         
         stats = {
             "loaded": True,
-            "document_count": len(self.index.docstore.docs) if hasattr(self.index, 'docstore') else "Unknown",
-            "persist_dir": self.persist_dir,
+            "vector_count": self._vector_count(),
+            "collection": self.collection_name,
+            "qdrant": self.qdrant_url or self.persist_dir,
             "data_dir": self.data_dir
         }
         
@@ -116,14 +540,21 @@ class PsychologyRAG:
 
 # Convenience functions for simple usage
 def create_rag_model(persist_dir: str = "./storage", data_dir: str = "./psych_pdfs") -> PsychologyRAG:
-    """Create and initialize a RAG model"""
+    """Create and initialize a RAG model
+    
+    Building an index from PARALLEL_LOAD_MIN_FILES or more files uses a spawn
+    process pool, so scripts must call this under `if __name__ == "__main__":`.
+    """
     rag = PsychologyRAG(persist_dir, data_dir)
     rag.load_or_create_index()
     return rag
 
 
 def quick_query(question: str, rag_model: Optional[PsychologyRAG] = None) -> str:
-    """Quick query function for testing"""
+    """Quick query function for testing
+    
+    May build the index (see create_rag_model) - call under `if __name__ == "__main__":`.
+    """
     if not rag_model:
         rag_model = create_rag_model()
     